@@ -2,7 +2,9 @@ import dash
 import dash_bootstrap_components as dbc
 from dash.dependencies import ALL
 from dash import html, dcc, Input, Output, State, callback_context
+from dash.exceptions import PreventUpdate
 import json
+import random
 from dotenv import load_dotenv
 import os
 import gspread
@@ -79,6 +81,56 @@ def get_category_color(category):
         category_colors[category] = color
     return category_colors[category]
 
+# Precompute the question indices belonging to each category so drill sets can be drawn without rescanning the bank
+category_question_indices = {category: [] for category in categories_for_filter}
+for i, question in enumerate(questions):
+    category_question_indices[question['category']].append(i)
+
+# Settings for the weak-area drill mode
+DRILL_QUESTION_COUNT = 20   # Number of questions in each drill set
+DRILL_MIN_WEIGHT = 0.1      # Keeps strong categories in the mix at a low rate
+DRILL_UNTESTED_WEIGHT = 0.5 # Weight for categories that were not part of the last set
+
+# Function to build the running per-category counters for a question set
+def new_category_stats(question_set):
+    category_stats = {}
+    for question_index in question_set:
+        category = questions[question_index]['category']
+        if category not in category_stats:
+            category_stats[category] = {"correct": 0, "total": 0}
+        category_stats[category]["total"] += 1
+    return category_stats
+
+# Function to update the running counters when an answer is recorded (or changed)
+def record_answer(category_stats, question, previous_answer, new_answer):
+    delta = (new_answer == question['answer']) - (previous_answer == question['answer'])
+    if delta:
+        category_stats[question['category']]["correct"] += delta
+
+# Function to draw a drill set weighted towards the categories with the lowest scores
+def build_drill_set(category_stats, size=DRILL_QUESTION_COUNT):
+    def get_weight(category):
+        score_data = category_stats.get(category)
+        if not score_data or not score_data['total']:
+            return DRILL_UNTESTED_WEIGHT
+        return 1 - score_data['correct'] / score_data['total'] + DRILL_MIN_WEIGHT
+
+    weights = {category: get_weight(category) for category in category_question_indices}
+
+    # Decide how many questions to take from each category, skipping categories whose pool is used up
+    quotas = dict.fromkeys(category_question_indices, 0)
+    for _ in range(min(size, total_questions)):
+        open_categories = [category for category in quotas if quotas[category] < len(category_question_indices[category])]
+        category = random.choices(open_categories, weights=[weights[category] for category in open_categories])[0]
+        quotas[category] += 1
+
+    # Draw the questions from each category's pool and mix the categories together
+    drill_set = []
+    for category, quota in quotas.items():
+        drill_set.extend(random.sample(category_question_indices[category], quota))
+    random.shuffle(drill_set)
+    return drill_set
+
 # App layout with Bootstrap components
 app.layout = dbc.Container([
     dbc.Row([
@@ -134,6 +186,8 @@ app.layout = dbc.Container([
     dcc.Store(id='pins', data=[]),
     dcc.Store(id='jumped-question', data={'index': None}),
     dcc.Store(id='quiz-submitted', data=False),
+    dcc.Store(id='question-set', data=list(range(total_questions))),
+    dcc.Store(id='category-stats', data=new_category_stats(range(total_questions))),
     dcc.Store(id="category-selection-store", data=categories_for_filter)
 ], fluid=True, style={"maxWidth": "880px"})
 
@@ -141,10 +195,10 @@ app.layout = dbc.Container([
 @app.callback(
     [Output('navigation-buttons-row', 'className'),
      Output('pinned-questions-row', 'className')],
-    [Input('submit-quiz', 'n_clicks')]
+    [Input('quiz-submitted', 'data')]
 )
-def hide_quiz_rows(submit_clicks):
-    if submit_clicks:
+def hide_quiz_rows(quiz_submitted):
+    if quiz_submitted:
         navigation_buttons_row_class = "mb-4 nav-buttons justify-content-around hidden"
         pinned_questions_row_class = "hidden"
     else:
@@ -175,11 +229,12 @@ def update_pin_button(current_question, pins):
      Output('next-question', 'className'),
      Output('submit-quiz', 'disabled'),
      Output('submit-quiz', 'className')],
-    Input('current-question', 'data')
+    Input('current-question', 'data'),
+    State('question-set', 'data')
 )
-def update_button_states(current_question):
+def update_button_states(current_question, question_set):
     # Check if the user is on the last question
-    is_last_question = current_question == total_questions - 1
+    is_last_question = current_question == len(question_set) - 1
 
     # Set disabled state for both buttons
     next_disabled = is_last_question  # Disable Next Question if on the last question
@@ -240,17 +295,21 @@ app.clientside_callback(
     Output("category-filter-wrapper", "style"),
     [Input("category-selection-store", "data"),
     Input("quiz-submitted", "data")],
-    State("user-answers", "data")
+    [State("user-answers", "data"),
+    State("question-set", "data")]
 )
-def update_question_accordion(selected_categories, quiz_submitted, user_answers):
+def update_question_accordion(selected_categories, quiz_submitted, user_answers, question_set):
     # Ensure user_answers is defined
     if user_answers is None:
-        user_answers = [None] * len(questions)
+        user_answers = [None] * len(question_set)
 
     # If the quiz hasn't been submitted yet, don't show the accordion
     if not quiz_submitted:
         return [], {"display": "none"}, {"display": "none"}
 
+    # Look up the questions in the active set
+    active_questions = [questions[question_index] for question_index in question_set]
+
     # Generate accordion items only for filtered questions
     accordion_items = [
         dbc.AccordionItem(
@@ -284,7 +343,7 @@ def update_question_accordion(selected_categories, quiz_submitted, user_answers)
             className="mb-2 question-result-container " +
                       ("correct-answer-header" if user_answers[i] == question['answer'] else "incorrect-answer-header")
         )
-        for i, question in enumerate(questions) if question['category'] in selected_categories
+        for i, question in enumerate(active_questions) if question['category'] in selected_categories
     ]
 
     # Set the accordion to be visible
@@ -298,18 +357,23 @@ def update_question_accordion(selected_categories, quiz_submitted, user_answers)
      Output('score-display', 'children'),               # Score display
      Output('current-question', 'data'),                # Current question
      Output('pins', 'data'),                            # Pins for pinned questions
-     Output('quiz-submitted', 'data')],                 # Whether the user has submitted the quiz yet
+     Output('quiz-submitted', 'data'),                  # Whether the user has submitted the quiz yet
+     Output('question-set', 'data'),                    # Question indices in the active set
+     Output('category-stats', 'data')],                 # Running per-category scores
     [Input('next-question', 'n_clicks'),                # Next button click
      Input('prev-question', 'n_clicks'),                # Previous button click
      Input('submit-quiz', 'n_clicks'),                  # Submit button click
      Input('pin-question', 'n_clicks'),                 # Pin button click
      Input({'type': 'jump-question', 'index': ALL}, 'n_clicks'),   # Jump button clicks
-     Input({'type': 'unpin-question', 'index': ALL}, 'n_clicks')], # Unpin question
+     Input({'type': 'unpin-question', 'index': ALL}, 'n_clicks'), # Unpin question
+     Input({'type': 'start-drill', 'index': ALL}, 'n_clicks')],    # Start weak-area drill
     [State('jumped-question', 'data'),                  # Track jump to question
      State('user-answers', 'data'),                     # Track user answers
      State('current-question', 'data'),                 # Track current question
      State('answer-options', 'value'),                  # Track selected answer (inside RadioItems)
-     State('pins', 'data')]                             # Track pinned questions
+     State('pins', 'data'),                             # Track pinned questions
+     State('question-set', 'data'),                     # Track the active question set
+     State('category-stats', 'data')]                   # Track running per-category scores
 )
 def handle_quiz_actions(next_clicks, 
                         prev_clicks, 
@@ -317,16 +381,35 @@ def handle_quiz_actions(next_clicks,
                         pin_clicks, 
                         jump_clicks_list,
                         unpin_clicks_list,
+                        drill_clicks_list,
                         jumped_question, 
                         user_answers, 
                         current_question, 
                         selected_answer, 
-                        pins):
+                        pins,
+                        question_set,
+                        category_stats):
     ctx = callback_context
     triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
     score_display = dash.no_update
+    quiz_submitted = dash.no_update
     pinned_display = []
 
+    # Start a new drill set weighted towards the weakest categories of the submitted set
+    if triggered_id and 'start-drill' in triggered_id and any(drill_clicks_list):
+        question_set = build_drill_set(category_stats)
+        category_stats = new_category_stats(question_set)
+        user_answers = [None] * len(question_set)
+        pins = []
+        current_question = 0
+        selected_answer = None
+        score_display = []
+        quiz_submitted = False
+
+    # Nothing to update once the quiz has been submitted
+    elif current_question is None:
+        raise PreventUpdate
+
     # Check if a Jump button was clicked
     if triggered_id and 'jump-question' in triggered_id:
         # Identify which Jump button was clicked by checking the `index` in the triggered_id
@@ -334,13 +417,15 @@ def handle_quiz_actions(next_clicks,
         clicked_index = button_id['index']  # Extracts the index
         current_question = clicked_index  # Update current_question to this index
 
-    # Save the selected answer
+    # Save the selected answer and update the running category scores
     if selected_answer is not None:
+        previous_answer = user_answers[current_question]
         user_answers[current_question] = selected_answer
+        record_answer(category_stats, questions[question_set[current_question]], previous_answer, selected_answer)
 
     # Handle navigation: Next or Previous Question
     if triggered_id == 'next-question':
-        if current_question < len(questions) - 1:
+        if current_question < len(question_set) - 1:
             current_question += 1
 
     # Handle nevigation to the previous question        
@@ -350,7 +435,7 @@ def handle_quiz_actions(next_clicks,
     # Handle quiz submission, hiding elements, calculating score, and rendering output
     elif triggered_id == 'submit-quiz':
         quiz_submitted = True
-        score = sum(1 for i, answer in enumerate(user_answers) if answer == questions[i]['answer'])
+        score = sum(score_data['correct'] for score_data in category_stats.values())
 
         # Initialize score_display as a list to prevent errors when appending items
         score_display = [
@@ -379,25 +464,11 @@ def handle_quiz_actions(next_clicks,
             ])
         ]
 
-        category_scores = {}
-        for i, question in enumerate(questions):
-            category = question["category"]
-            is_correct = user_answers[i] == question['answer']
-            
-            # Initialize category data if not already present
-            if category not in category_scores:
-                category_scores[category] = {"correct": 0, "total": 0}
-                
-            # Update counts
-            category_scores[category]["total"] += 1
-            if is_correct:
-                category_scores[category]["correct"] += 1
-        
         # Generate table rows for each category with scores and percentages
         table_rows = []
         categories = []
         scores_percent = []
-        for category, score_data in category_scores.items():
+        for category, score_data in category_stats.items():
             correct = score_data['correct']
             total = score_data['total']
             percent = (correct / total) * 100 if total > 0 else 0
@@ -425,10 +496,10 @@ def handle_quiz_actions(next_clicks,
         )
 
         # Add the overall score as the last row with a darker background
-        overall_percent = (score / len(questions)) * 100 if len(questions) > 0 else 0
+        overall_percent = (score / len(question_set)) * 100 if len(question_set) > 0 else 0
         table_rows.append(html.Tr([
             html.Td("Overall Score", style={"font-weight": "bold", "background-color": "#FFDD6C", "color": "#222222"}),
-            html.Td(f"{score} / {len(questions)} ({overall_percent:.1f}%)", style={"font-weight": "bold", "background-color": "#FFDD6C", "color": "#222222"})
+            html.Td(f"{score} / {len(question_set)} ({overall_percent:.1f}%)", style={"font-weight": "bold", "background-color": "#FFDD6C", "color": "#222222"})
         ]))
 
         # Function to add line breaks for long labels
@@ -553,6 +624,15 @@ def handle_quiz_actions(next_clicks,
         # Add the score table and chart to the score display
         score_display.extend([score_chart, category_score_table])
 
+        # Offer a follow-up drill focused on the weakest categories
+        score_display.extend([
+            html.P(
+                f"Start a {min(DRILL_QUESTION_COUNT, total_questions)}-question drill that focuses on the categories "
+                "where you scored lowest."
+            ),
+            dbc.Button("Start Weak-Area Drill 🎯", id={'type': 'start-drill', 'index': 0}, outline=True, color="primary", className="mb-3")
+        ])
+
         # Add the H2 header for the next section
         individual_question_review_h2 = html.H2("Individual Question Review", className="mt-4 mb-3")
         score_display.extend([individual_question_review_h2])
@@ -570,7 +650,7 @@ def handle_quiz_actions(next_clicks,
         
         # Hide other quiz components (optional, based on previous setup)
         current_question = None  # Reset current question if needed
-        return None, user_answers, None, score_display, current_question, pins, quiz_submitted
+        return None, user_answers, None, score_display, current_question, pins, quiz_submitted, question_set, category_stats
 
     # Handle pinning questions
     elif triggered_id == 'pin-question':
@@ -598,7 +678,7 @@ def handle_quiz_actions(next_clicks,
                     dbc.Col(
                         html.Span([
                             html.Strong(f"Question {pin_index + 1}: "),
-                            f"{questions[pin_index]['question']} (",
+                            f"{questions[question_set[pin_index]]['question']} (",
                             html.Span([
                                 html.Strong("Current response: "),  # Bold "Current response:"
                                 f"{current_response})"  # Regular weight for the actual response
@@ -624,7 +704,7 @@ def handle_quiz_actions(next_clicks,
         )
 
     # Prepare to display the current question and options
-    question = questions[current_question]
+    question = questions[question_set[current_question]]
     options = [{'label': option, 'value': option} for option in question["options"]]
     selected_answer = user_answers[current_question] if user_answers[current_question] is not None else None
     
@@ -646,7 +726,9 @@ def handle_quiz_actions(next_clicks,
         score_display,
         current_question,
         pins,
-        dash.no_update
+        quiz_submitted,
+        question_set,
+        category_stats
     )
 
 # Run the app